@@ -0,0 +1,181 @@
+"""
+Contributor analytics based on sparse incidence matrices. Every author
+is a row of an author x issue matrix (number of events of the author on
+the issue) and of an author x label matrix (number of issues with the
+label the author took part in). Relational questions, such as which
+contributors work on the same issues, are answered with sparse matrix
+products instead of loops over pairs of contributors.
+"""
+
+from typing import Dict, List, Tuple
+
+import numpy as np
+from scipy import sparse
+
+from data_loader import DataLoader
+from event_index import EventIndex
+import config
+
+
+class ContributorMatrix:
+    """
+    Sparse (CSR) incidence matrices of authors, issues and labels.
+    """
+
+    def __init__(self, index:EventIndex):
+        """
+        Constructor. Builds the matrices from the events in the index.
+        """
+        issues = index.issues
+        self.author_names:List[str] = index.author_names
+        self.label_names:List[str] = []
+        label_codes:Dict[str,int] = {}
+
+        # Events without an author cannot be attributed to anyone
+        known = index.authors >= 0
+        self.events:sparse.csr_matrix = sparse.csr_matrix(
+            (np.ones(np.count_nonzero(known), dtype=np.int32), (index.authors[known], index.issue_positions[known])),
+            shape=(len(self.author_names), len(issues)))
+        self.events.sum_duplicates()
+        # 1 where the author took part in the issue
+        self.participation:sparse.csr_matrix = self.events.copy()
+        self.participation.data[:] = 1
+
+        rows:List[int] = []
+        cols:List[int] = []
+        for issue_position, issue in enumerate(issues):
+            for label in set(issue.labels):
+                if label not in label_codes:
+                    label_codes[label] = len(self.label_names)
+                    self.label_names.append(label)
+                rows.append(issue_position)
+                cols.append(label_codes[label])
+        issue_labels = sparse.csr_matrix((np.ones(len(rows), dtype=np.int32), (rows, cols)),
+                                         shape=(len(issues), len(self.label_names)))
+        self.labels:sparse.csr_matrix = (self.participation @ issue_labels).tocsr()
+
+    def co_participation(self) -> sparse.csr_matrix:
+        """
+        Returns the symmetric author x author matrix with the number of
+        issues both authors took part in. The diagonal is zero.
+        """
+        shared = (self.participation @ self.participation.T).tocsr()
+        shared.setdiag(0)
+        shared.eliminate_zeros()
+        return shared
+
+    def issue_counts(self) -> np.ndarray:
+        """
+        Number of issues each author took part in.
+        """
+        return np.asarray(self.participation.sum(axis=1)).ravel()
+
+    def label_reach(self) -> np.ndarray:
+        """
+        Number of distinct labels on the issues each author took part in.
+        """
+        return self.labels.getnnz(axis=1)
+
+    def collaborator_counts(self, shared:sparse.csr_matrix=None) -> np.ndarray:
+        """
+        Number of distinct authors each author shares an issue with.
+        """
+        shared = self.co_participation() if shared is None else shared
+        return shared.getnnz(axis=1)
+
+    def centrality(self, shared:sparse.csr_matrix=None, iterations:int=100, tolerance:float=1e-9) -> np.ndarray:
+        """
+        Eigenvector centrality of the authors in the co-participation
+        graph, computed by power iteration. Authors that share many issues
+        with other central authors score highest.
+        """
+        shared = self.co_participation() if shared is None else shared
+        scores = np.ones(shared.shape[0]) / max(shared.shape[0], 1)
+        for _ in range(iterations):
+            updated = shared @ scores + scores
+            norm = np.linalg.norm(updated)
+            if norm == 0:
+                return scores
+            updated /= norm
+            if np.abs(updated - scores).sum() < tolerance:
+                return updated
+            scores = updated
+        return scores
+
+    def top_pairs(self, n:int=10, shared:sparse.csr_matrix=None) -> List[Tuple[str,str,int]]:
+        """
+        Returns the n pairs of authors that share the most issues.
+        """
+        shared = self.co_participation() if shared is None else shared
+        upper = sparse.triu(shared, k=1).tocoo()
+        top = np.argsort(-upper.data, kind='stable')[:n]
+        return [(self.author_names[upper.row[i]], self.author_names[upper.col[i]], int(upper.data[i])) for i in top]
+
+    def collaborators(self, author:str, n:int=10, shared:sparse.csr_matrix=None) -> List[Tuple[str,int]]:
+        """
+        Returns the n authors that share the most issues with the given author.
+        """
+        if author not in self.author_names:
+            return []
+        shared = self.co_participation() if shared is None else shared
+        row = shared.getrow(self.author_names.index(author))
+        top = np.argsort(-row.data, kind='stable')[:n]
+        return [(self.author_names[row.indices[i]], int(row.data[i])) for i in top]
+
+    def top(self, scores:np.ndarray, n:int=10) -> List[Tuple[str,float]]:
+        """
+        Returns the n authors with the highest scores.
+        """
+        n = min(n, len(scores))
+        if n == 0:
+            return []
+        candidates = np.argpartition(-scores, n - 1)[:n]
+        ranked = candidates[np.argsort(-scores[candidates], kind='stable')]
+        return [(self.author_names[i], scores[i]) for i in ranked]
+
+
+class ContributorAnalysis:
+    """
+    Ranks contributors by their reach across issues and labels and by
+    their position in the network of contributors working on the same
+    issues.
+    """
+
+    def __init__(self):
+        """
+        Constructor
+        """
+        # Parameter is passed in via command line (--user)
+        self.USER:str = config.get_parameter('user')
+
+    def run(self):
+        """
+        Starting point for this analysis.
+        """
+        matrix = ContributorMatrix(DataLoader().get_event_index())
+        shared = matrix.co_participation()
+
+        rankings = [
+            ('Issues Participated In', matrix.issue_counts()),
+            ('Distinct Labels Reached', matrix.label_reach()),
+            ('Distinct Collaborators', matrix.collaborator_counts(shared)),
+            ('Collaboration Centrality', matrix.centrality(shared)),
+        ]
+        for title, scores in rankings:
+            print(f'\nTop 10 Contributors by {title}:')
+            for author, score in matrix.top(scores):
+                print(f'{author}: {score:.4f}' if isinstance(score, float) else f'{author}: {score}')
+
+        print('\nTop 10 Contributor Pairs by Shared Issues:')
+        for author, other, count in matrix.top_pairs(shared=shared):
+            print(f'{author} & {other}: {count}')
+
+        if self.USER is not None:
+            print(f'\nTop 10 Collaborators of {self.USER}:')
+            for author, count in matrix.collaborators(self.USER, shared=shared):
+                print(f'{author}: {count}')
+
+
+if __name__ == '__main__':
+    # Invoke run method when running this module directly
+    ContributorAnalysis().run()
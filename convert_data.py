@@ -0,0 +1,68 @@
+"""
+Converts an issues data file from one format into another. This is
+mainly used to turn the provided JSON array into NDJSON (one issue per
+line) so that it can be streamed and split for parallel loading.
+
+The input and output formats, including compression, are derived from
+the file extensions, e.g.:
+
+    python convert_data.py poetry_issues.json poetry_issues.ndjson.gz
+"""
+
+import argparse
+import json
+
+from data_loader import open_data_file, is_ndjson
+
+
+def parse_args():
+    """
+    Parses the command line arguments that were provided along
+    with the python command.
+    """
+    ap = argparse.ArgumentParser("convert_data.py")
+
+    ap.add_argument('input', type=str,
+                    help='Path of the data file to convert')
+    ap.add_argument('output', type=str,
+                    help='Path of the converted data file')
+
+    return ap.parse_args()
+
+
+def read_records(path:str):
+    """
+    Yields the raw JSON issue records contained in a data file.
+    """
+    with open_data_file(path) as fin:
+        if is_ndjson(path):
+            for line in fin:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from json.load(fin)
+
+
+def convert(input_path:str, output_path:str) -> int:
+    """
+    Writes all issues of the input file to the output file and
+    returns the number of issues written.
+    """
+    count:int = 0
+    with open_data_file(output_path, 'wt') as fout:
+        if is_ndjson(output_path):
+            for record in read_records(input_path):
+                fout.write(json.dumps(record))
+                fout.write('\n')
+                count += 1
+        else:
+            records = list(read_records(input_path))
+            json.dump(records, fout)
+            count = len(records)
+    return count
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    count = convert(args.input, args.output)
+    print(f'Converted {count} issues from {args.input} to {args.output}.')
@@ -1,24 +1,200 @@
 
+import bz2
+import glob
+import gzip
 import json
-from typing import List
+import lzma
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Tuple, Union
 
 import config
+from event_index import EventIndex
+from memory_monitor import monitor, estimate_memory, STRATEGIES
 from model import Issue
+from text_store import load_deferred
 
 # Store issues as singleton to avoid reloads
 _ISSUES:List[Issue] = None
 
+# Time-sorted index over the events of _ISSUES, built on first use
+_EVENT_INDEX:EventIndex = None
+
+# Compression is detected from the last file extension. Each opener
+# decompresses as the file is read so the data never has to be
+# expanded on disk.
+_OPENERS = {
+    '.gz': gzip.open,
+    '.bz2': bz2.open,
+    '.xz': lzma.open,
+}
+
+# Extensions of files that contain one issue per line
+_NDJSON_EXTENSIONS = ('.ndjson', '.jsonl')
+
+
+def open_data_file(path:str, mode:str='rt'):
+    """
+    Opens a data file, transparently (de)compressing it if its
+    extension is one of the supported compression formats.
+    """
+    _, ext = os.path.splitext(path)
+    opener = _OPENERS.get(ext.lower())
+    if opener is None:
+        return open(path, mode, encoding='utf-8')
+    return opener(path, mode, encoding='utf-8')
+
+
+def is_compressed(path:str) -> bool:
+    """
+    Whether the file extension denotes a compressed file.
+    """
+    return os.path.splitext(path)[1].lower() in _OPENERS
+
+
+def is_ndjson(path:str) -> bool:
+    """
+    Whether the file contains one JSON issue per line, ignoring
+    any compression extension.
+    """
+    base, ext = os.path.splitext(path)
+    if ext.lower() in _OPENERS:
+        _, ext = os.path.splitext(base)
+    return ext.lower() in _NDJSON_EXTENSIONS
+
+
+def resolve_data_paths(value:Union[str,List[str]]) -> List[str]:
+    """
+    Expands the configured data path setting, which can be a single
+    path, a glob pattern or a list of either, into the sorted list of
+    data files it refers to. Raises FileNotFoundError if a glob
+    pattern does not match any file.
+    """
+    if value is None:
+        return []
+    patterns = [value] if isinstance(value, str) else list(value)
+    paths:List[str] = []
+    for pattern in patterns:
+        if glob.has_magic(pattern):
+            matches = sorted(glob.glob(pattern))
+            if not matches:
+                raise FileNotFoundError(f"No data files match the pattern '{pattern}'.")
+            paths.extend(matches)
+        else:
+            paths.append(pattern)
+    return paths
+
+
+def repository_name(path:str) -> str:
+    """
+    Derives the name of the repository a data file belongs to from
+    its file name by stripping the format and compression extensions.
+    """
+    name = os.path.basename(path)
+    base, ext = os.path.splitext(name)
+    if ext.lower() in _OPENERS:
+        name = base
+    base, ext = os.path.splitext(name)
+    if ext.lower() in _NDJSON_EXTENSIONS + ('.json',):
+        name = base
+    return name
+
+
+def _to_issue(jobj:dict, skip_events:bool=False) -> Issue:
+    """
+    Creates an issue from its JSON record, leaving out its events
+    if requested.
+    """
+    if skip_events:
+        jobj['events'] = []
+    return Issue(jobj)
+
+
+def _byte_ranges(path:str, num_ranges:int) -> List[Tuple[int,int]]:
+    """
+    Splits an uncompressed NDJSON file into at most num_ranges byte ranges
+    whose boundaries fall right after a newline, so every line belongs
+    to exactly one range.
+    """
+    size = os.path.getsize(path)
+    boundaries = [0]
+    with open(path, 'rb') as fin:
+        for i in range(1, num_ranges):
+            fin.seek(size * i // num_ranges)
+            fin.readline()
+            position = fin.tell()
+            if boundaries[-1] < position < size:
+                boundaries.append(position)
+    boundaries.append(size)
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def _load_range(path:str, start:int, end:int, text_cache_size:int=None, skip_events:bool=False) -> List[Issue]:
+    """
+    Parses the issues contained in one byte range of an NDJSON file.
+    Text fields are deferred if a text cache size is given.
+    Invoked in worker processes.
+    """
+    if text_cache_size is not None:
+        return load_deferred(path, True, start, end, text_cache_size, skip_events)
+    with open(path, 'rb') as fin:
+        fin.seek(start)
+        data = fin.read(end - start)
+    return [_to_issue(json.loads(line), skip_events) for line in data.splitlines() if line.strip()]
+
+
 class DataLoader:
     """
     Loads the issue data into a runtime object.
+
+    The data file can either be a JSON array of issues or an NDJSON file
+    (``.ndjson``/``.jsonl``) with one issue per line. Both can be compressed
+    with gzip (``.gz``), bz2 (``.bz2``) or xz (``.xz``).
+
+    ``ENPM611_PROJECT_DATA_PATH`` may also be a glob pattern or a list of
+    paths, one per repository, in which case the issues of all files are
+    combined. Use ``sharded_analysis`` to analyze each file separately.
+
+    If ``ENPM611_PROJECT_DEFER_TEXT`` is enabled, the issue bodies and
+    comments of uncompressed files are not loaded into memory but read
+    from the file when they are accessed (see ``text_store``).
+
+    If ``ENPM611_PROJECT_MEMORY_BUDGET_MB`` is set, the memory needed to
+    load the files is projected beforehand. If it exceeds the budget, the
+    loader defers the text fields and, if allowed, leaves out the events
+    of the issues when that is not enough. This only lowers the peak for
+    NDJSON files, since JSON arrays have to be parsed completely either way.
     """
-    
-    def __init__(self):
+
+    def __init__(self, data_path:Union[str,List[str]]=None, allow_skip_events:bool=False, expand:bool=True):
         """
-        Constructor
+        Constructor. Loads the configured data files unless a
+        specific path (or list of paths) is given. allow_skip_events
+        lets the memory budget load the issues without their events,
+        which only callers that do not use the events should allow.
+        expand=False takes the paths as they are instead of expanding
+        glob patterns, for paths that were already resolved.
         """
-        self.data_path:str = config.get_parameter('ENPM611_PROJECT_DATA_PATH')
-        
+        if data_path is None:
+            data_path = config.get_parameter('ENPM611_PROJECT_DATA_PATH')
+        if expand:
+            self.data_paths:List[str] = resolve_data_paths(data_path)
+        else:
+            self.data_paths:List[str] = [data_path] if isinstance(data_path, str) else list(data_path)
+        self.data_path:str = ', '.join(self.data_paths)
+        # Number of worker processes used to parse uncompressed NDJSON files
+        self.workers:int = int(config.get_parameter('ENPM611_PROJECT_DATA_WORKERS', 1))
+        # Whether to keep Issue.text and Event.comment on disk until accessed
+        self.defer_text:bool = bool(config.get_parameter('ENPM611_PROJECT_DEFER_TEXT', False))
+        # Maximum number of deferred texts cached in memory
+        self.text_cache_size:int = int(config.get_parameter('ENPM611_PROJECT_TEXT_CACHE_SIZE', 1024))
+        # Whether to load the issues without their events
+        self.skip_events:bool = bool(config.get_parameter('ENPM611_PROJECT_SKIP_EVENTS', False))
+        # Memory budget for loading the data in MB (none if not set)
+        self.memory_budget:float = config.get_parameter('ENPM611_PROJECT_MEMORY_BUDGET_MB')
+        # Whether the memory budget may leave out the events
+        self.allow_skip_events:bool = allow_skip_events
+
     def get_issues(self):
         """
         This should be invoked by other parts of the application to get access
@@ -29,15 +205,132 @@ class DataLoader:
             _ISSUES = self._load()
             print(f'Loaded {len(_ISSUES)} issues from {self.data_path}.')
         return _ISSUES
-    
+
+    def get_event_index(self) -> EventIndex:
+        """
+        Returns the index of all events sorted by date, which answers
+        date range queries without walking the events of every issue.
+        """
+        global _EVENT_INDEX
+        if _EVENT_INDEX is None:
+            issues = self.get_issues()
+            with monitor.stage('build event index'):
+                _EVENT_INDEX = EventIndex(issues)
+        return _EVENT_INDEX
+
+    def iter_chunks(self, chunk_size:int=10000) -> Iterator[List[Issue]]:
+        """
+        Yields the issues of the data files in lists of at most chunk_size
+        issues, so that they can be processed without holding all of them
+        in memory. NDJSON files are streamed; JSON arrays still have to be
+        parsed completely.
+        """
+        for path in self.data_paths:
+            with open_data_file(path) as fin:
+                if is_ndjson(path):
+                    records = (json.loads(line) for line in fin if line.strip())
+                else:
+                    records = iter(json.load(fin))
+                chunk:List[Issue] = []
+                for record in records:
+                    chunk.append(_to_issue(record, self.skip_events))
+                    if len(chunk) == chunk_size:
+                        yield chunk
+                        chunk = []
+                if chunk:
+                    yield chunk
+
     def _load(self):
         """
         Loads the issues into memory.
         """
-        with open(self.data_path,'r') as fin:
-            return [Issue(i) for i in json.load(fin)]
-    
+        with monitor.stage('load issues'):
+            self._apply_memory_budget()
+            issues:List[Issue] = []
+            for path in self.data_paths:
+                issues.extend(self._load_file(path))
+        return issues
+
+    def _apply_memory_budget(self):
+        """
+        Picks the loading strategy with the most data whose projected
+        memory usage fits into the memory budget. JSON arrays are projected
+        with the same peak for every strategy, so a fallback is only picked
+        if it lowers the peak of the NDJSON files. Events are only left out
+        if the caller allows it.
+        """
+        if not self.memory_budget:
+            return
+        budget = float(self.memory_budget) * 2 ** 20
+        can_defer_text = not any(is_compressed(path) for path in self.data_paths)
+        projected = {strategy: 0 for strategy in STRATEGIES}
+        for path in self.data_paths:
+            estimates = estimate_memory(path, is_ndjson(path), can_defer_text)
+            if estimates is None:
+                print(f'Could not estimate the memory needed to load {path}.')
+                return
+            for strategy in STRATEGIES:
+                if projected[strategy] is not None and strategy in estimates:
+                    projected[strategy] += estimates[strategy]
+                else:
+                    projected[strategy] = None
+        strategies = [strategy for strategy in STRATEGIES
+                      if projected[strategy] is not None and (strategy != 'skip_events' or self.allow_skip_events)]
+        for strategy in strategies:
+            if projected[strategy] <= budget:
+                break
+        else:
+            needed = projected[strategies[-1]] / 2 ** 20
+            if all(is_ndjson(path) for path in self.data_paths):
+                raise MemoryError(
+                    f'Loading {self.data_path} needs about {needed:.0f} MB even with the {strategies[-1]} strategy, '
+                    f'which exceeds the memory budget of {self.memory_budget} MB. Use the multi-repository summary '
+                    f'(--feature 4), which processes the issues in chunks, or raise the budget.')
+            raise MemoryError(
+                f'Loading {self.data_path} needs about {needed:.0f} MB, which exceeds the memory budget of '
+                f'{self.memory_budget} MB. JSON arrays have to be parsed at once, so leaving out the text or the '
+                f'events does not lower this peak. Convert the data to NDJSON with convert_data.py, or raise the budget.')
+        if strategy == 'full':
+            return
+        print(f'Loading all data needs about {projected["full"] / 2 ** 20:.0f} MB, which exceeds the memory '
+              f'budget of {self.memory_budget} MB. Using the {strategy} strategy '
+              f'(about {projected[strategy] / 2 ** 20:.0f} MB) instead.')
+        self.defer_text = self.defer_text or can_defer_text
+        if strategy == 'skip_events':
+            self.skip_events = True
+            print('Issues are loaded without their events; event based statistics will be empty.')
+
+    def _load_file(self, path:str):
+        """
+        Loads the issues of a single data file.
+        """
+        deferred = self.defer_text and not is_compressed(path)
+        if deferred and (self.workers <= 1 or not is_ndjson(path)):
+            return load_deferred(path, is_ndjson(path), cache_size=self.text_cache_size, skip_events=self.skip_events)
+        if not is_ndjson(path):
+            with open_data_file(path) as fin:
+                return [_to_issue(i, self.skip_events) for i in json.load(fin)]
+        if self.workers > 1 and not is_compressed(path):
+            return self._load_parallel(path)
+        with open_data_file(path) as fin:
+            return [_to_issue(json.loads(line), self.skip_events) for line in fin if line.strip()]
+
+    def _load_parallel(self, path:str):
+        """
+        Loads an uncompressed NDJSON file by parsing newline-aligned
+        byte ranges in separate worker processes.
+        """
+        ranges = _byte_ranges(path, self.workers)
+        text_cache_size = self.text_cache_size if self.defer_text else None
+        issues:List[Issue] = []
+        with ProcessPoolExecutor(max_workers=len(ranges)) as executor:
+            futures = [executor.submit(_load_range, path, start, end, text_cache_size, self.skip_events)
+                       for start, end in ranges]
+            for future in futures:
+                issues.extend(future.result())
+        return issues
+
 
 if __name__ == '__main__':
     # Run the loader for testing
-    DataLoader().get_issues()
\ No newline at end of file
+    DataLoader(allow_skip_events=True).get_issues()
\ No newline at end of file
@@ -0,0 +1,211 @@
+"""
+Global index of all events sorted by their event_date. The events are
+stored as parallel arrays (timestamp, issue position, event type, author
+and label), with strings replaced by codes into lookup tables. Date range
+lookups are binary searches, so windowed statistics only touch the events
+inside the window instead of walking every Issue.events list.
+"""
+
+from datetime import datetime, timezone
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from model import Issue, Event
+
+_SECONDS_PER_DAY = 86400
+
+_GROUPS = ('type', 'author', 'label')
+
+
+def _to_timestamp(date:datetime) -> int:
+    """
+    Converts a date into seconds since the epoch. Dates without
+    a timezone are treated as UTC.
+    """
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return int(date.timestamp())
+
+
+class _Codes:
+    """
+    Assigns consecutive integer codes to strings.
+    """
+
+    def __init__(self):
+        self.names:List[str] = []
+        self.codes:Dict[str,int] = {}
+
+    def code(self, name:str) -> int:
+        if name is None:
+            return -1
+        if name not in self.codes:
+            self.codes[name] = len(self.names)
+            self.names.append(name)
+        return self.codes[name]
+
+
+class EventIndex:
+    """
+    Time-sorted index over the events of all issues.
+    """
+
+    def __init__(self, issues:List[Issue]):
+        """
+        Constructor. Builds the index from the events of the issues.
+        Events without a date are not indexed.
+        """
+        self.issues:List[Issue] = issues
+        event_types, authors, labels = _Codes(), _Codes(), _Codes()
+        rows:List[Tuple[int,int,int,int,int,int]] = []
+        for issue_position, issue in enumerate(issues):
+            for event_position, event in enumerate(issue.events):
+                if event.event_date is None:
+                    continue
+                rows.append((_to_timestamp(event.event_date), issue_position, event_position,
+                             event_types.code(event.event_type), authors.code(event.author),
+                             labels.code(event.label)))
+        columns = np.array(rows, dtype=np.int64).reshape(-1, 6)
+        order = np.argsort(columns[:, 0], kind='stable')
+        columns = columns[order]
+
+        self.timestamps:np.ndarray = columns[:, 0].copy()
+        self.issue_positions:np.ndarray = columns[:, 1].astype(np.int32)
+        self.event_positions:np.ndarray = columns[:, 2].astype(np.int32)
+        self.event_types:np.ndarray = columns[:, 3].astype(np.int32)
+        self.authors:np.ndarray = columns[:, 4].astype(np.int32)
+        self.labels:np.ndarray = columns[:, 5].astype(np.int32)
+        self.event_type_names:List[str] = event_types.names
+        self.author_names:List[str] = authors.names
+        self.label_names:List[str] = labels.names
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def range(self, start:datetime=None, end:datetime=None) -> Tuple[int,int]:
+        """
+        Returns the positions [lo, hi) of the events with
+        start <= event_date < end. Either bound can be omitted.
+        """
+        lo = 0 if start is None else int(np.searchsorted(self.timestamps, _to_timestamp(start), side='left'))
+        hi = len(self) if end is None else int(np.searchsorted(self.timestamps, _to_timestamp(end), side='left'))
+        return lo, max(lo, hi)
+
+    def events_between(self, start:datetime=None, end:datetime=None) -> List[Tuple[Issue,Event]]:
+        """
+        Returns the events with start <= event_date < end, together
+        with their issues, in chronological order.
+        """
+        lo, hi = self.range(start, end)
+        return [(self.issues[i], self.issues[i].events[e])
+                for i, e in zip(self.issue_positions[lo:hi], self.event_positions[lo:hi])]
+
+    def _group(self, by:str) -> Tuple[np.ndarray,List[str]]:
+        if by not in _GROUPS:
+            raise ValueError(f"Cannot group events by '{by}'. Use one of: {', '.join(_GROUPS)}")
+        if by == 'type':
+            return self.event_types, self.event_type_names
+        if by == 'author':
+            return self.authors, self.author_names
+        return self.labels, self.label_names
+
+    def _buckets(self, timestamps:np.ndarray, freq:str) -> Tuple[np.ndarray,np.ndarray]:
+        """
+        Maps timestamps to the start day of their day, week (starting on
+        Monday) or month. Returns the bucket of every timestamp and the
+        sorted list of all buckets between the first and last timestamp.
+        """
+        days = (timestamps // _SECONDS_PER_DAY).astype('datetime64[D]')
+        if freq == 'day':
+            buckets = days
+            step = np.timedelta64(1, 'D')
+        elif freq == 'week':
+            # 1970-01-01 was a Thursday, so shifting by 3 days makes weeks start on Monday
+            offset = (days.astype(np.int64) + 3) % 7
+            buckets = days - offset.astype('timedelta64[D]')
+            step = np.timedelta64(7, 'D')
+        elif freq == 'month':
+            buckets = days.astype('datetime64[M]')
+            step = np.timedelta64(1, 'M')
+        else:
+            raise ValueError(f"Unknown frequency '{freq}'. Use 'day', 'week' or 'month'.")
+        if len(buckets) == 0:
+            return buckets, buckets
+        return buckets, np.arange(buckets[0], buckets[-1] + step, step)
+
+    def counts(self, freq:str='month', by:str='type', start:datetime=None, end:datetime=None) -> Dict[str,Dict[str,int]]:
+        """
+        Counts the events between start and end per day, week or month,
+        grouped by event type, author or label. Returns a dict that maps
+        every period (including empty ones) to the counts per group.
+        """
+        periods, names, groups, rows, counts = self._sparse_counts(freq, by, start, end)
+        return self._to_dict(periods, names, groups, rows, counts)
+
+    def rolling_counts(self, window:int, freq:str='month', by:str='type', start:datetime=None, end:datetime=None) -> Dict[str,Dict[str,int]]:
+        """
+        Like counts(), but every period holds the sum of the counts of
+        itself and the window - 1 periods before it.
+        """
+        if window < 1:
+            raise ValueError(f'The window must span at least one period, got {window}.')
+        periods, names, groups, rows, counts = self._sparse_counts(freq, by, start, end)
+        num_periods = len(periods)
+        # Every count enters the window in its own period and leaves it
+        # window periods later, so the rolling sums only change there
+        leaves = rows + window < num_periods
+        groups = np.concatenate([groups, groups[leaves]])
+        rows = np.concatenate([rows, rows[leaves] + window])
+        changes = np.concatenate([counts, -counts[leaves]])
+        keys, inverse = np.unique(groups * num_periods + rows, return_inverse=True)
+        deltas = np.zeros(len(keys), dtype=np.int64)
+        np.add.at(deltas, inverse, changes)
+        groups, rows = keys // max(num_periods, 1), keys % max(num_periods, 1)
+
+        # Running sum of the changes, restarted for every group
+        first = np.r_[True, groups[1:] != groups[:-1]] if len(keys) else np.zeros(0, dtype=bool)
+        totals = np.cumsum(deltas)
+        totals -= (totals - deltas)[first][np.cumsum(first) - 1]
+
+        # Each sum holds until the next change of its group or the last period
+        last = np.r_[first[1:], True] if len(keys) else first
+        until = np.where(last, num_periods, np.r_[rows[1:], num_periods])
+        lengths = np.where(totals != 0, until - rows, 0)
+        steps = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        return self._to_dict(periods, names, np.repeat(groups, lengths), np.repeat(rows, lengths) + steps,
+                             np.repeat(totals, lengths))
+
+    def _sparse_counts(self, freq:str, by:str, start:datetime, end:datetime) -> Tuple[List[str],List[str],np.ndarray,np.ndarray,np.ndarray]:
+        """
+        Counts the events per period and group. Returns the period names,
+        the group names and the nonzero counts as parallel arrays of group
+        codes, period positions and counts, sorted by group and period.
+        """
+        codes, names = self._group(by)
+        lo, hi = self.range(start, end)
+        buckets, periods = self._buckets(self.timestamps[lo:hi], freq)
+        codes = codes[lo:hi]
+        # Events without a value for the group (e.g. unlabeled events) are not counted
+        known = codes >= 0
+        rows = np.searchsorted(periods, buckets[known])
+        num_periods = max(len(periods), 1)
+        keys, counts = np.unique(codes[known].astype(np.int64) * num_periods + rows, return_counts=True)
+        return [str(period) for period in periods], names, keys // num_periods, keys % num_periods, counts
+
+    def _to_dict(self, periods:List[str], names:List[str], groups:np.ndarray, rows:np.ndarray, counts:np.ndarray) -> Dict[str,Dict[str,int]]:
+        """
+        Converts nonzero counts into a dict of all periods that maps
+        each period to the counts per group name.
+        """
+        result:Dict[str,Dict[str,int]] = {period: {} for period in periods}
+        order = np.lexsort((groups, rows))
+        for group, row, count in zip(groups[order].tolist(), rows[order].tolist(), counts[order].tolist()):
+            result[periods[row]][names[group]] = count
+        return result
+
+if __name__ == '__main__':
+    # Print the monthly event counts per event type for testing
+    from data_loader import DataLoader
+    for period, counts in DataLoader().get_event_index().counts('month', 'type').items():
+        print(period, counts)
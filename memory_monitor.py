@@ -0,0 +1,293 @@
+"""
+Memory instrumentation and memory budget estimation.
+
+MemoryMonitor records, per named stage, the memory allocated by Python
+(via tracemalloc) and the resident set size (RSS) of the process, which
+is sampled in a background thread to catch the peak within the stage.
+It is enabled with the ENPM611_PROJECT_MEMORY_REPORT config parameter.
+
+estimate_memory() projects how much memory loading a data file will take
+with each loading strategy by parsing a small sample of the file and
+measuring the allocations of the resulting objects.
+"""
+
+import bz2
+import json
+import lzma
+import os
+import threading
+import time
+import tracemalloc
+import zlib
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+import config
+from model import Issue, DeferredText
+
+_MB = 2 ** 20
+
+# Number of decompressed bytes parsed to calibrate the estimate
+_SAMPLE_BYTES = 4 * _MB
+
+# Loading strategies in the order in which they are tried when the
+# projected memory usage exceeds the budget
+STRATEGIES = ('full', 'defer_text', 'skip_events')
+
+_DECOMPRESSORS = {
+    '.gz': lambda: zlib.decompressobj(16 + zlib.MAX_WBITS),
+    '.bz2': bz2.BZ2Decompressor,
+    '.xz': lzma.LZMADecompressor,
+}
+
+
+def current_rss() -> Optional[int]:
+    """
+    Returns the resident set size of the process in bytes, or None
+    if it cannot be determined on this platform.
+    """
+    try:
+        with open('/proc/self/statm', 'r') as fin:
+            return int(fin.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        # Only the peak is available; ru_maxrss is in bytes on macOS and KiB elsewhere
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if os.uname().sysname == 'Darwin' else peak * 1024
+    except (ImportError, AttributeError):
+        return None
+
+
+class StageStats:
+    """
+    Memory statistics of one stage.
+    """
+
+    def __init__(self, name:str):
+        self.name:str = name
+        self.seconds:float = 0
+        # Bytes allocated through Python that were still alive at the end of the stage
+        self.allocated:int = 0
+        # Highest number of bytes allocated through Python during the stage
+        self.peak_allocated:int = 0
+        self.rss_before:int = None
+        self.rss_after:int = None
+        self.peak_rss:int = None
+
+
+class MemoryMonitor:
+    """
+    Records memory statistics for named stages of a run.
+    """
+
+    def __init__(self, enabled:bool=None, interval:float=0.05):
+        """
+        Constructor. Uses the ENPM611_PROJECT_MEMORY_REPORT config
+        parameter unless enabled is given. interval is the number of
+        seconds between RSS samples.
+        """
+        if enabled is None:
+            enabled = bool(config.get_parameter('ENPM611_PROJECT_MEMORY_REPORT', False))
+        self.enabled:bool = enabled
+        self.interval:float = interval
+        self.stages:List[StageStats] = []
+        # Stages that have been entered but not yet exited
+        self._open:List[StageStats] = []
+
+    @contextmanager
+    def stage(self, name:str):
+        """
+        Context manager that records the memory statistics of the
+        code it wraps. Stages can be nested. Does nothing if the
+        monitor is disabled.
+        """
+        if not self.enabled:
+            yield None
+            return
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self._fold_peak()
+        stats = StageStats(name)
+        allocated_before = tracemalloc.get_traced_memory()[0]
+        self._open.append(stats)
+        stats.rss_before = current_rss()
+        stats.peak_rss = stats.rss_before
+
+        stop = threading.Event()
+        def sample():
+            while not stop.wait(self.interval):
+                self._update_peak_rss(stats, current_rss())
+        sampler = threading.Thread(target=sample, daemon=True)
+        sampler.start()
+        start = time.perf_counter()
+        try:
+            yield stats
+        finally:
+            stats.seconds = time.perf_counter() - start
+            stop.set()
+            sampler.join()
+            self._fold_peak()
+            self._open.pop()
+            stats.allocated = tracemalloc.get_traced_memory()[0] - allocated_before
+            stats.peak_allocated -= allocated_before
+            stats.rss_after = current_rss()
+            self._update_peak_rss(stats, stats.rss_after)
+            self.stages.append(stats)
+
+    def _fold_peak(self):
+        """
+        Adds the tracemalloc peak since the last call to all open stages
+        and resets it, so that nested stages measure their own peak
+        without losing the peak of the enclosing stages.
+        """
+        peak = tracemalloc.get_traced_memory()[1]
+        for stats in self._open:
+            stats.peak_allocated = max(stats.peak_allocated, peak)
+        tracemalloc.reset_peak()
+
+    def _update_peak_rss(self, stats:StageStats, rss:int):
+        if rss is not None and (stats.peak_rss is None or rss > stats.peak_rss):
+            stats.peak_rss = rss
+
+    def report(self):
+        """
+        Prints the statistics of all recorded stages.
+        """
+        if not self.enabled or not self.stages:
+            return
+        def mb(value):
+            return f'{value / _MB:10.1f}' if value is not None else f'{"n/a":>10}'
+        print('\nMemory usage per stage (MB):')
+        print(f'{"stage":<30}{"seconds":>10}{"retained":>10}{"peak":>10}{"rss":>10}{"peak rss":>10}')
+        for stats in self.stages:
+            print(f'{stats.name:<30}{stats.seconds:10.2f}{mb(stats.allocated)}{mb(stats.peak_allocated)}'
+                  f'{mb(stats.rss_after)}{mb(stats.peak_rss)}')
+
+
+# Monitor shared by all parts of the application
+monitor = MemoryMonitor()
+
+
+def _read_sample(path:str) -> Tuple[bytes,int]:
+    """
+    Returns the first decompressed bytes of a data file and an estimate
+    of the total decompressed size of the file.
+    """
+    size = os.path.getsize(path)
+    decompressor_type = _DECOMPRESSORS.get(os.path.splitext(path)[1].lower())
+    with open(path, 'rb') as fin:
+        if decompressor_type is None:
+            return fin.read(_SAMPLE_BYTES), size
+        decompressor = decompressor_type()
+        sample:List[bytes] = []
+        sample_size, consumed = 0, 0
+        while sample_size < _SAMPLE_BYTES:
+            chunk = fin.read(64 * 1024)
+            if not chunk:
+                break
+            consumed += len(chunk)
+            data = decompressor.decompress(chunk)
+            sample.append(data)
+            sample_size += len(data)
+    if consumed == 0:
+        return b'', 0
+    # Assume the rest of the file compresses like the sample
+    return b''.join(sample), int(size * sample_size / consumed)
+
+
+def _parse_sample(sample:bytes, ndjson:bool) -> Tuple[List[dict],int]:
+    """
+    Parses the complete records contained in a sample. Returns the
+    records and the number of bytes they take up in the file.
+    """
+    text = sample.decode('utf-8', errors='ignore')
+    decoder = json.JSONDecoder()
+    records:List[dict] = []
+    if ndjson:
+        lines = text.split('\n')
+        # The last line is cut off unless the sample holds the whole file
+        complete = lines if len(sample) < _SAMPLE_BYTES else lines[:-1]
+        records = [json.loads(line) for line in complete if line.strip()]
+        used = sum(len(line.encode('utf-8')) + 1 for line in complete)
+        return records, used
+    position = text.find('[') + 1
+    end = position
+    while position > 0:
+        while position < len(text) and text[position] in ' \t\r\n,':
+            position += 1
+        try:
+            record, position = decoder.raw_decode(text, position)
+        except ValueError:
+            break
+        records.append(record)
+        end = position
+    return records, len(text[:end].encode('utf-8'))
+
+
+def _measure(build) -> int:
+    """
+    Returns the number of bytes allocated by the objects build() returns.
+    """
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objects = build()
+    allocated = tracemalloc.get_traced_memory()[0] - before
+    del objects
+    if not tracing:
+        tracemalloc.stop()
+    return allocated
+
+
+def _issue_without(jobj:dict, defer_text:bool, skip_events:bool) -> Issue:
+    """
+    Creates an issue the way the loader does for the given strategy.
+    """
+    if skip_events:
+        jobj = dict(jobj, events=[])
+    issue = Issue(jobj)
+    if defer_text:
+        if issue.text is not None:
+            issue.text = DeferredText(None, 0, 0)
+        for event in issue.events:
+            if event.comment is not None:
+                event.comment = DeferredText(None, 0, 0)
+    return issue
+
+
+def estimate_memory(path:str, ndjson:bool, can_defer_text:bool) -> Optional[Dict[str,int]]:
+    """
+    Projects the number of bytes needed to load a data file with each
+    strategy. Returns None if the sample does not hold a complete record.
+
+    A JSON array is parsed completely before any issue is created, so all
+    strategies share the same peak: the parsed records plus the issues
+    built from them. Only NDJSON files can be loaded with less memory.
+    """
+    sample, total_size = _read_sample(path)
+    records, used = _parse_sample(sample, ndjson)
+    if not records or used == 0:
+        return None
+    # The issues are built from freshly parsed records so that the strings
+    # they keep are measured as well
+    raws = [json.dumps(record) for record in records]
+    del records
+    strategies = [strategy for strategy in STRATEGIES if strategy != 'defer_text' or can_defer_text]
+    if not ndjson:
+        array = '[' + ','.join(raws) + ']'
+        def parse_array():
+            # The issues keep the strings of the records, which are measured once
+            parsed = json.loads(array)
+            return parsed, [Issue(record) for record in parsed]
+        peak = int(_measure(parse_array) * total_size / used)
+        return {strategy: peak for strategy in strategies}
+    estimates = {}
+    for strategy in strategies:
+        defer_text = can_defer_text and strategy != 'full'
+        skip_events = strategy == 'skip_events'
+        allocated = _measure(lambda: [_issue_without(json.loads(raw), defer_text, skip_events) for raw in raws])
+        estimates[strategy] = int(allocated * total_size / used)
+    return estimates
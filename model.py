@@ -17,6 +17,22 @@ class State(str, Enum):
     closed = 'closed'
 
 
+class DeferredText:
+    """
+    Reference to a text field that stays in the data file and is
+    only read from it when the field is accessed.
+    """
+    __slots__ = ('store', 'start', 'end')
+
+    def __init__(self, store:any, start:int, end:int):
+        self.store = store
+        self.start:int = start
+        self.end:int = end
+
+    def load(self) -> str:
+        return self.store.read(self.start, self.end)
+
+
 class Event:
     
     def __init__(self, jobj:any):
@@ -38,6 +54,25 @@ class Event:
             pass
         self.label = jobj.get('label')
         self.comment = jobj.get('comment')
+
+    @property
+    def comment(self) -> str:
+        if isinstance(self._comment, DeferredText):
+            return self._comment.load()
+        return self._comment
+
+    @comment.setter
+    def comment(self, value):
+        self._comment = value
+
+    def to_json(self) -> dict:
+        return {
+            'event_type': self.event_type,
+            'author': self.author,
+            'event_date': self.event_date.isoformat() if self.event_date else None,
+            'label': self.label,
+            'comment': self.comment,
+        }
         
         
 class Issue:
@@ -80,4 +115,30 @@ class Issue:
         except:
             pass
         self.timeline_url = jobj.get('timeline_url')
-        self.events = [Event(jevent) for jevent in jobj.get('events',[])]
\ No newline at end of file
+        self.events = [Event(jevent) for jevent in jobj.get('events',[])]
+
+    @property
+    def text(self) -> str:
+        if isinstance(self._text, DeferredText):
+            return self._text.load()
+        return self._text
+
+    @text.setter
+    def text(self, value):
+        self._text = value
+
+    def to_json(self) -> dict:
+        return {
+            'url': self.url,
+            'creator': self.creator,
+            'labels': self.labels,
+            'state': self.state.value if self.state else None,
+            'assignees': self.assignees,
+            'title': self.title,
+            'text': self.text,
+            'number': self.number,
+            'created_date': self.created_date.isoformat() if self.created_date else None,
+            'updated_date': self.updated_date.isoformat() if self.updated_date else None,
+            'timeline_url': self.timeline_url,
+            'events': [event.to_json() for event in self.events],
+        }
@@ -0,0 +1,77 @@
+"""
+Runs several analyses at the same time in separate worker processes.
+The data file is loaded once by the parent process and handed to the
+workers through shared memory (see shared_dataset), so the workers
+neither reload the file nor receive a pickled copy of the issues.
+"""
+
+from typing import Dict, List, Tuple
+
+import config
+import data_loader
+from data_loader import DataLoader
+from example_analysis import ExampleAnalysis
+from analysis_1 import Analysis1
+from analysis_2 import Analysis2
+from analysis_3 import Analysis3
+from scheduler import ProcessScheduler
+from shared_dataset import SharedDataset
+
+_ANALYSES = {
+    0: ExampleAnalysis,
+    1: Analysis1,
+    2: Analysis2,
+    3: Analysis3,
+}
+
+
+def _run_analysis(task:Tuple[Dict,int]) -> int:
+    """
+    Attaches to the shared dataset and runs one analysis on it.
+    Invoked in worker processes.
+    """
+    manifest, feature = task
+    dataset = SharedDataset.attach(manifest)
+    try:
+        # The analyses get their issues from the loader's singleton
+        data_loader._ISSUES = dataset.issues()
+        _ANALYSES[feature]().run()
+    finally:
+        data_loader._ISSUES = None
+        dataset.close()
+    return feature
+
+
+class ParallelAnalysis:
+    """
+    Runs the given analyses in parallel on a dataset in shared memory.
+    """
+
+    def __init__(self, features:List[int]=None):
+        """
+        Constructor. Runs analyses 1 to 3 unless other features are given.
+        """
+        self.features:List[int] = features or [1, 2, 3]
+
+    def run(self):
+        """
+        Starting point for this analysis.
+        """
+        # Analysis 1 asks for a missing label on the console, which the
+        # workers cannot do since they have no standard input
+        if 1 in self.features and not config.get_parameter('label'):
+            print('Analysis 1 needs a label when it runs in parallel. Pass one with --label. Exiting analysis.')
+            return
+        issues = DataLoader().get_issues()
+        with SharedDataset.create(issues) as dataset:
+            # Drop the parent's copy so that the workers only share the blocks
+            del issues
+            data_loader._ISSUES = None
+            tasks = [(dataset.manifest, feature) for feature in self.features]
+            for feature in ProcessScheduler(len(tasks)).map(_run_analysis, tasks):
+                print(f'Finished analysis {feature}.')
+
+
+if __name__ == '__main__':
+    # Invoke run method when running this module directly
+    ParallelAnalysis().run()
@@ -8,10 +8,14 @@ the command line to run the analyses.
 import argparse
 
 import config
+from memory_monitor import monitor
 from example_analysis import ExampleAnalysis
 from analysis_1 import Analysis1
 from analysis_2 import Analysis2
 from analysis_3 import Analysis3
+from sharded_analysis import ShardedAnalysis
+from contributor_network import ContributorAnalysis
+from parallel_analysis import ParallelAnalysis
 
 
 def parse_args():
@@ -28,7 +32,7 @@ def parse_args():
     
     # Required parameter specifying what analysis to run
     ap.add_argument('--feature', '-f', type=int, required=True,
-                    help='Which of the three features to run')
+                    help='Which of the three features to run (4 runs the multi-repository summary, 5 the contributor network analysis, 6 analyses 1 to 3 in parallel, which requires --label)')
     
     # Optional parameter for analyses focusing on a specific user (i.e., contributor)
     ap.add_argument('--user', '-u', type=str, required=False,
@@ -42,19 +46,28 @@ def parse_args():
 
 
 
-# Parse feature to call from command line arguments
-args = parse_args()
-# Add arguments to config so that they can be accessed in other parts of the application
-config.overwrite_from_args(args)
-    
-# Run the feature specified in the --feature flag
-if args.feature == 0:
-    ExampleAnalysis().run()
-elif args.feature == 1:
-    Analysis1().run()
-elif args.feature == 2:
-    Analysis2().run()
-elif args.feature == 3:
-    Analysis3().run()
-else:
-    print('Need to specify which feature to run with --feature flag.')
+if __name__ == '__main__':
+    # Parse feature to call from command line arguments
+    args = parse_args()
+    # Add arguments to config so that they can be accessed in other parts of the application
+    config.overwrite_from_args(args)
+
+    # Run the feature specified in the --feature flag and record its memory usage
+    with monitor.stage(f'feature {args.feature}'):
+        if args.feature == 0:
+            ExampleAnalysis().run()
+        elif args.feature == 1:
+            Analysis1().run()
+        elif args.feature == 2:
+            Analysis2().run()
+        elif args.feature == 3:
+            Analysis3().run()
+        elif args.feature == 4:
+            ShardedAnalysis().run()
+        elif args.feature == 5:
+            ContributorAnalysis().run()
+        elif args.feature == 6:
+            ParallelAnalysis().run()
+        else:
+            print('Need to specify which feature to run with --feature flag.')
+    monitor.report()
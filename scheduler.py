@@ -0,0 +1,91 @@
+"""
+Pluggable schedulers that run independent tasks, such as the analysis
+of one data shard, and return their results in task order.
+
+A scheduler only needs to implement ``map``. New schedulers (e.g. one
+that dispatches tasks to other hosts) can be made available through
+``register_scheduler`` and selected with the ``ENPM611_PROJECT_SCHEDULER``
+config parameter.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Type
+
+import config
+
+
+class Scheduler:
+    """
+    Base class of all schedulers.
+    """
+
+    def map(self, fn:Callable[[Any], Any], tasks:Iterable[Any]) -> List[Any]:
+        """
+        Applies fn to every task and returns the results in the
+        order of the tasks. fn and the tasks must be picklable for
+        schedulers that run them outside the current process.
+        """
+        raise NotImplementedError()
+
+
+class SerialScheduler(Scheduler):
+    """
+    Runs all tasks one after another in the current process.
+    """
+
+    def __init__(self, workers:int=None):
+        """
+        Constructor. The number of workers is ignored.
+        """
+        pass
+
+    def map(self, fn, tasks):
+        return [fn(task) for task in tasks]
+
+
+class ProcessScheduler(Scheduler):
+    """
+    Runs the tasks concurrently in a pool of local worker processes.
+    """
+
+    def __init__(self, workers:int=None):
+        """
+        Constructor. Uses one worker per CPU unless a number
+        of workers is given.
+        """
+        self.workers:int = workers
+
+    def map(self, fn, tasks):
+        tasks = list(tasks)
+        if not tasks:
+            return []
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            return list(executor.map(fn, tasks))
+
+
+_SCHEDULERS:Dict[str,Type[Scheduler]] = {
+    'serial': SerialScheduler,
+    'process': ProcessScheduler,
+}
+
+
+def register_scheduler(name:str, scheduler_class:Type[Scheduler]):
+    """
+    Makes a scheduler implementation available under the given name.
+    """
+    _SCHEDULERS[name] = scheduler_class
+
+
+def get_scheduler(name:str=None, workers:int=None) -> Scheduler:
+    """
+    Creates the scheduler with the given name, falling back to the
+    ``ENPM611_PROJECT_SCHEDULER`` and ``ENPM611_PROJECT_SCHEDULER_WORKERS``
+    config parameters.
+    """
+    if name is None:
+        name = config.get_parameter('ENPM611_PROJECT_SCHEDULER', 'process')
+    if workers is None:
+        workers = config.get_parameter('ENPM611_PROJECT_SCHEDULER_WORKERS')
+    if name not in _SCHEDULERS:
+        raise ValueError(f"Unknown scheduler '{name}'. Available: {', '.join(_SCHEDULERS)}")
+    return _SCHEDULERS[name](int(workers) if workers else None)
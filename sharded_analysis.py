@@ -0,0 +1,182 @@
+"""
+Analyzes several repositories at once. Every configured data file is
+treated as a shard that is loaded and reduced to partial aggregates in
+a worker. The partial aggregates are then merged into per-repository
+and combined results.
+"""
+
+from collections import Counter
+from typing import Dict, List, Set
+
+from data_loader import DataLoader, repository_name
+from model import Issue
+from scheduler import get_scheduler
+
+
+class ShardAggregate:
+    """
+    Partial aggregates of the issues of one shard. Aggregates of
+    different shards can be combined with merge().
+    """
+
+    def __init__(self, repository:str=None):
+        """
+        Constructor
+        """
+        self.repositories:List[str] = [repository] if repository else []
+        self.issues:int = 0
+        self.events:int = 0
+        self.states:Counter = Counter()
+        self.contributors:Set[str] = set()
+        # Number of events per event type and author
+        self.activity:Dict[str,Counter] = {}
+        # Number of 'labeled' events per label
+        self.labeled:Counter = Counter()
+        # Sum and count of closure times (in days) per label, month and year
+        self.closure_sum:Dict[str,Counter] = {'label': Counter(), 'month': Counter(), 'year': Counter()}
+        self.closure_count:Dict[str,Counter] = {'label': Counter(), 'month': Counter(), 'year': Counter()}
+
+    def add_issues(self, issues:List[Issue]):
+        """
+        Adds the issues to the aggregates.
+        """
+        for issue in issues:
+            self.issues += 1
+            self.states[issue.state.value if issue.state else None] += 1
+            self.events += len(issue.events)
+            closed_date = None
+            for event in issue.events:
+                if event.author is not None:
+                    self.contributors.add(event.author)
+                self.activity.setdefault(event.event_type, Counter())[event.author] += 1
+                if event.event_type == 'labeled':
+                    self.labeled[event.label] += 1
+                if event.event_type == 'closed' and closed_date is None:
+                    closed_date = event.event_date
+
+            # Closure time from creation until the first 'closed' event
+            if closed_date is not None and issue.created_date is not None:
+                open_duration = (closed_date - issue.created_date).total_seconds() / 86400
+                keys = {'month': [closed_date.strftime('%m')], 'year': [closed_date.strftime('%Y')], 'label': issue.labels}
+                for kind, values in keys.items():
+                    for value in values:
+                        self.closure_sum[kind][value] += open_duration
+                        self.closure_count[kind][value] += 1
+        return self
+
+    def merge(self, other:'ShardAggregate'):
+        """
+        Merges the aggregates of another shard into this one.
+        """
+        self.repositories.extend(other.repositories)
+        self.issues += other.issues
+        self.events += other.events
+        self.states.update(other.states)
+        self.contributors |= other.contributors
+        for event_type, counts in other.activity.items():
+            self.activity.setdefault(event_type, Counter()).update(counts)
+        self.labeled.update(other.labeled)
+        for kind in self.closure_sum:
+            self.closure_sum[kind].update(other.closure_sum[kind])
+            self.closure_count[kind].update(other.closure_count[kind])
+        return self
+
+    def top_contributors(self, event_type:str, n:int=10):
+        """
+        Returns the n authors with the most events of the given type.
+        """
+        return self.activity.get(event_type, Counter()).most_common(n)
+
+    def average_closure_times(self, kind:str) -> Dict[str,float]:
+        """
+        Returns the average closure time in days per label,
+        month or year.
+        """
+        return {key: self.closure_sum[kind][key] / count
+                for key, count in sorted(self.closure_count[kind].items())}
+
+
+def analyze_shard(path:str) -> ShardAggregate:
+    """
+    Loads a single data file and reduces it to its aggregates.
+    Invoked in worker processes.
+    """
+    aggregate = ShardAggregate(repository_name(path))
+    # Only one chunk of issues is held in memory at a time
+    # The path is already resolved and must not be expanded as a glob again
+    for issues in DataLoader(path, expand=False).iter_chunks():
+        aggregate.add_issues(issues)
+    return aggregate
+
+
+class ShardedAnalysis:
+    """
+    Runs the contributor and closure time statistics for every
+    configured repository and for all repositories combined.
+    """
+
+    def __init__(self):
+        """
+        Constructor
+        """
+        self.data_paths:List[str] = DataLoader().data_paths
+
+    def aggregate(self) -> Dict[str,ShardAggregate]:
+        """
+        Computes the aggregates of all shards and merges them per
+        repository. Several files of the same repository are merged
+        into a single aggregate.
+        """
+        partials = get_scheduler().map(analyze_shard, self.data_paths)
+        repositories:Dict[str,ShardAggregate] = {}
+        for path, partial in zip(self.data_paths, partials):
+            name = repository_name(path)
+            if name in repositories:
+                repositories[name].merge(partial)
+                repositories[name].repositories = [name]
+            else:
+                repositories[name] = partial
+        return repositories
+
+    def combine(self, repositories:Dict[str,ShardAggregate]) -> ShardAggregate:
+        """
+        Merges the per-repository aggregates into combined aggregates.
+        """
+        combined = ShardAggregate()
+        for aggregate in repositories.values():
+            combined.merge(aggregate)
+        return combined
+
+    def run(self):
+        """
+        Starting point for this analysis.
+        """
+        repositories = self.aggregate()
+        for name, aggregate in repositories.items():
+            self.print_summary(name, aggregate)
+        if len(repositories) > 1:
+            self.print_summary(f'All {len(repositories)} repositories', self.combine(repositories))
+
+    def print_summary(self, title:str, aggregate:ShardAggregate):
+        """
+        Prints the statistics of one aggregate.
+        """
+        print(f'\n===== {title} =====')
+        print(f'{aggregate.issues} issues ({dict(aggregate.states)}), {aggregate.events} events, '
+              f'{len(aggregate.contributors)} unique contributors')
+        for event_type, heading in [('commented', 'Comments'), ('labeled', 'Labeling Activities'), ('closed', 'Issue Closings')]:
+            print(f'\nTop 10 Contributors by {heading}:')
+            for author, count in aggregate.top_contributors(event_type):
+                print(f'{author}: {count}')
+        print('\nTop 10 Most Active Labels by Contributors:')
+        for label, count in aggregate.labeled.most_common(10):
+            print(f'{label}: {count}')
+        for kind in ['label', 'month', 'year']:
+            print(f'\nAverage Closure Time by {kind.capitalize()} (in days):')
+            for key, avg_time in aggregate.average_closure_times(kind).items():
+                print(f'{key}: {avg_time:.2f} days')
+
+
+if __name__ == '__main__':
+    # Invoke run method when running this module directly
+    ShardedAnalysis().run()
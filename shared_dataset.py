@@ -0,0 +1,383 @@
+"""
+Shares the loaded issues with worker processes through
+multiprocessing.shared_memory instead of reloading the data file or
+pickling the issues for every worker.
+
+The parent process packs the issues once into columnar numpy arrays
+(one shared memory block per column) and a table of all distinct
+strings. Workers attach to the blocks by name and access the issues
+through lightweight views with the same attributes as model.Issue and
+model.Event, so the existing analyses run on them unchanged.
+
+Issue bodies and comments are left out unless requested, since none of
+the analyses read them and copying them would load deferred texts (see
+text_store) back into memory.
+"""
+
+from datetime import datetime, timedelta, timezone
+from multiprocessing import shared_memory
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from model import Issue, State
+
+_EPOCH = datetime(1970, 1, 1)
+
+# Marks missing dates and strings in the integer columns
+_NO_DATE = np.iinfo(np.int64).min
+_NO_STRING = -1
+
+# Marks dates without a timezone in the UTC offset columns
+_NAIVE = np.iinfo(np.int64).min
+
+_DATES = ('created_date', 'updated_date', 'event_date')
+
+_STATES = [State.open, State.closed]
+
+# Column name -> name of the model attribute holding a string
+_ISSUE_STRINGS = {'url': 'url', 'creator': 'creator', 'title': 'title', 'text': 'text', 'timeline_url': 'timeline_url'}
+_EVENT_STRINGS = {'event_type': 'event_type', 'event_author': 'author', 'event_label': 'label', 'event_comment': 'comment'}
+
+# String columns that are only packed if the text is requested
+_TEXT_COLUMNS = ('text', 'event_comment')
+
+
+def _to_micros(date:datetime) -> Tuple[int,int]:
+    """
+    Converts a date into its local time in microseconds since the epoch
+    and its UTC offset in seconds.
+    """
+    if date is None:
+        return _NO_DATE, _NAIVE
+    offset = date.utcoffset()
+    local = date.replace(tzinfo=None) - _EPOCH
+    return local // timedelta(microseconds=1), _NAIVE if offset is None else int(offset.total_seconds())
+
+
+def _from_micros(value:int, offset:int) -> datetime:
+    if value == _NO_DATE:
+        return None
+    date = _EPOCH + timedelta(microseconds=int(value))
+    if offset == _NAIVE:
+        return date
+    return date.replace(tzinfo=timezone(timedelta(seconds=int(offset))))
+
+
+class _StringTable:
+    """
+    Collects the distinct strings and assigns codes to them.
+    """
+
+    def __init__(self):
+        self.codes:Dict[str,int] = {}
+        self.strings:List[str] = []
+
+    def code(self, value:str) -> int:
+        if value is None:
+            return _NO_STRING
+        if value not in self.codes:
+            self.codes[value] = len(self.strings)
+            self.strings.append(value)
+        return self.codes[value]
+
+    def to_arrays(self) -> Tuple[np.ndarray,np.ndarray]:
+        """
+        Returns the UTF-8 bytes of all strings and the offsets
+        at which each string starts (plus the end offset).
+        """
+        encoded = [value.encode('utf-8') for value in self.strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+        return np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets
+
+
+def _append_date(columns:Dict[str,list], name:str, date:datetime):
+    value, offset = _to_micros(date)
+    columns[name].append(value)
+    columns[f'{name}_utcoffset'].append(offset)
+
+
+def _pack(issues:List[Issue], include_text:bool=False) -> Dict[str,np.ndarray]:
+    """
+    Converts the issues into columnar arrays. Variable length fields
+    (labels, assignees and events) are stored as flat value arrays with
+    per-issue offsets. Issue bodies and comments are only stored if
+    include_text is set.
+    """
+    strings = _StringTable()
+    issue_strings = {column: attribute for column, attribute in _ISSUE_STRINGS.items()
+                     if include_text or column not in _TEXT_COLUMNS}
+    event_strings = {column: attribute for column, attribute in _EVENT_STRINGS.items()
+                     if include_text or column not in _TEXT_COLUMNS}
+    columns:Dict[str,list] = {name: [] for name in issue_strings}
+    columns.update({'state': [], 'number': [], 'created_date': [], 'updated_date': [],
+                    'label_values': [], 'assignee_values': [],
+                    'label_offsets': [0], 'assignee_offsets': [0], 'event_offsets': [0],
+                    'event_date': []})
+    columns.update({f'{name}_utcoffset': [] for name in _DATES})
+    columns.update({name: [] for name in event_strings})
+
+    for issue in issues:
+        for column, attribute in issue_strings.items():
+            columns[column].append(strings.code(getattr(issue, attribute)))
+        columns['state'].append(_STATES.index(issue.state) if issue.state in _STATES else -1)
+        columns['number'].append(issue.number)
+        _append_date(columns, 'created_date', issue.created_date)
+        _append_date(columns, 'updated_date', issue.updated_date)
+        columns['label_values'].extend(strings.code(label) for label in issue.labels)
+        columns['label_offsets'].append(len(columns['label_values']))
+        columns['assignee_values'].extend(strings.code(assignee) for assignee in issue.assignees)
+        columns['assignee_offsets'].append(len(columns['assignee_values']))
+        for event in issue.events:
+            for column, attribute in event_strings.items():
+                columns[column].append(strings.code(getattr(event, attribute)))
+            _append_date(columns, 'event_date', event.event_date)
+        columns['event_offsets'].append(len(columns['event_date']))
+
+    arrays = {name: np.array(values, dtype=np.int8 if name == 'state' else np.int64)
+              for name, values in columns.items()}
+    arrays['strings'], arrays['string_offsets'] = strings.to_arrays()
+    return arrays
+
+
+class EventView:
+    """
+    Read-only view of an event in a SharedDataset. Offers the
+    same attributes as model.Event.
+    """
+    __slots__ = ('_data', '_position')
+
+    def __init__(self, data:'SharedDataset', position:int):
+        self._data = data
+        self._position = position
+
+    @property
+    def event_type(self) -> str:
+        return self._data.string('event_type', self._position)
+
+    @property
+    def author(self) -> str:
+        return self._data.string('event_author', self._position)
+
+    @property
+    def label(self) -> str:
+        return self._data.string('event_label', self._position)
+
+    @property
+    def comment(self) -> str:
+        return self._data.string('event_comment', self._position)
+
+    @property
+    def event_date(self) -> datetime:
+        return self._data.date('event_date', self._position)
+
+
+class IssueView:
+    """
+    Read-only view of an issue in a SharedDataset. Offers the
+    same attributes as model.Issue.
+    """
+    __slots__ = ('_data', '_position')
+
+    def __init__(self, data:'SharedDataset', position:int):
+        self._data = data
+        self._position = position
+
+    @property
+    def url(self) -> str:
+        return self._data.string('url', self._position)
+
+    @property
+    def creator(self) -> str:
+        return self._data.string('creator', self._position)
+
+    @property
+    def title(self) -> str:
+        return self._data.string('title', self._position)
+
+    @property
+    def text(self) -> str:
+        return self._data.string('text', self._position)
+
+    @property
+    def timeline_url(self) -> str:
+        return self._data.string('timeline_url', self._position)
+
+    @property
+    def state(self) -> State:
+        code = self._data.arrays['state'][self._position]
+        return _STATES[code] if code >= 0 else None
+
+    @property
+    def number(self) -> int:
+        return int(self._data.arrays['number'][self._position])
+
+    @property
+    def created_date(self) -> datetime:
+        return self._data.date('created_date', self._position)
+
+    @property
+    def updated_date(self) -> datetime:
+        return self._data.date('updated_date', self._position)
+
+    @property
+    def labels(self) -> List[str]:
+        return self._data.strings('label', self._position)
+
+    @property
+    def assignees(self) -> List[str]:
+        return self._data.strings('assignee', self._position)
+
+    @property
+    def events(self) -> List[EventView]:
+        offsets = self._data.arrays['event_offsets']
+        return [EventView(self._data, position)
+                for position in range(offsets[self._position], offsets[self._position + 1])]
+
+
+class SharedIssues:
+    """
+    Sequence of the issues in a SharedDataset. Views are created
+    on access, so the issues are never copied into the worker.
+    """
+
+    def __init__(self, data:'SharedDataset'):
+        self._data = data
+
+    def __len__(self):
+        return len(self._data.arrays['number'])
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [IssueView(self._data, i) for i in range(*position.indices(len(self)))]
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError('issue index out of range')
+        return IssueView(self._data, position)
+
+    def __iter__(self):
+        for position in range(len(self)):
+            yield IssueView(self._data, position)
+
+
+class SharedDataset:
+    """
+    Issues stored as columnar arrays in shared memory blocks.
+
+    The process that creates the dataset owns the blocks and must call
+    unlink() (or use the dataset as a context manager) once all workers
+    are done. Workers attach with attach(manifest) and call close() when
+    they no longer need the data.
+    """
+
+    def __init__(self, blocks:Dict[str,shared_memory.SharedMemory], manifest:Dict[str,Tuple[str,str,int]], owner:bool):
+        self._blocks = blocks
+        self.manifest:Dict[str,Tuple[str,str,int]] = manifest
+        self.owner:bool = owner
+        self.arrays:Dict[str,np.ndarray] = {
+            column: np.ndarray((length,), dtype=np.dtype(dtype), buffer=blocks[column].buf)
+            for column, (_, dtype, length) in manifest.items()
+        }
+
+    @classmethod
+    def create(cls, issues:List[Issue], include_text:bool=False) -> 'SharedDataset':
+        """
+        Copies the issues into new shared memory blocks. Issue bodies
+        and comments are only copied if include_text is set; otherwise
+        the views return None for them.
+        """
+        blocks:Dict[str,shared_memory.SharedMemory] = {}
+        manifest:Dict[str,Tuple[str,str,int]] = {}
+        try:
+            for column, array in _pack(issues, include_text).items():
+                # Shared memory blocks cannot be empty
+                block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+                blocks[column] = block
+                np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[:] = array
+                manifest[column] = (block.name, array.dtype.str, len(array))
+        except BaseException:
+            for block in blocks.values():
+                block.close()
+                block.unlink()
+            raise
+        return cls(blocks, manifest, owner=True)
+
+    @classmethod
+    def attach(cls, manifest:Dict[str,Tuple[str,str,int]]) -> 'SharedDataset':
+        """
+        Attaches to the blocks of a dataset created by another process.
+        """
+        blocks:Dict[str,shared_memory.SharedMemory] = {}
+        # Worker processes share the resource tracker of the parent, so
+        # attaching does not make them responsible for unlinking the blocks
+        for column, (name, _, _) in manifest.items():
+            blocks[column] = shared_memory.SharedMemory(name=name)
+        return cls(blocks, manifest, owner=False)
+
+    def issues(self) -> SharedIssues:
+        """
+        Returns the issues as a sequence of read-only views.
+        """
+        return SharedIssues(self)
+
+    def string(self, column:str, position:int) -> str:
+        """
+        Returns the string stored for a row of a string column, or None
+        if the column was not packed.
+        """
+        if column not in self.arrays:
+            return None
+        return self._decode(self.arrays[column][position])
+
+    def date(self, column:str, position:int) -> datetime:
+        """
+        Returns the date stored for a row of a date column.
+        """
+        return _from_micros(self.arrays[column][position], self.arrays[f'{column}_utcoffset'][position])
+
+    def strings(self, name:str, position:int) -> List[str]:
+        """
+        Returns the strings of the given issue in a variable length
+        column (label or assignee).
+        """
+        offsets = self.arrays[f'{name}_offsets']
+        values = self.arrays[f'{name}_values'][offsets[position]:offsets[position + 1]]
+        return [self._decode(code) for code in values]
+
+    def _decode(self, code:int) -> str:
+        if code == _NO_STRING:
+            return None
+        offsets = self.arrays['string_offsets']
+        return bytes(self.arrays['strings'][offsets[code]:offsets[code + 1]]).decode('utf-8')
+
+    def close(self):
+        """
+        Detaches from the shared memory blocks. Views of the dataset
+        must not be used afterwards.
+        """
+        # The arrays export the blocks' buffers and have to be released first
+        self.arrays = {}
+        for block in self._blocks.values():
+            block.close()
+
+    def unlink(self):
+        """
+        Closes and frees the shared memory blocks. Only the
+        creating process may do this.
+        """
+        self.close()
+        if self.owner:
+            for block in self._blocks.values():
+                block.unlink()
+        self._blocks = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.owner:
+            self.unlink()
+        else:
+            self.close()
@@ -0,0 +1,210 @@
+"""
+Tests the timeline fetcher against a local aiohttp server that mimics
+the paginated, conditional and rate limited GitHub timeline API.
+
+Run with: python -m unittest test_timeline_fetcher
+"""
+
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import unittest
+
+import aiohttp
+from aiohttp import web
+
+from model import Issue, Event
+from timeline_fetcher import TimelineFetcher, write_issues
+
+# Number of events per page served by the local server
+_PAGE_SIZE = 2
+
+
+def _timeline_event(number:int) -> dict:
+    return {
+        'event': 'commented',
+        'actor': {'login': f'user{number}'},
+        'created_at': f'2024-01-{number + 1:02d}T00:00:00Z',
+        'body': f'comment {number}',
+    }
+
+
+class _TimelineServer:
+    """
+    Serves /timeline/<issue> with Link pagination and a per-page ETag.
+    Responses queued in failures are returned before the real ones; a
+    failure without a status drops the connection. Unknown issues are
+    answered with 404.
+    """
+
+    def __init__(self):
+        self.timelines = {}
+        self.failures = []
+        self.requests = []
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        asyncio.run_coroutine_threadsafe(self._start(), self.loop).result()
+
+    async def _start(self):
+        app = web.Application()
+        app.router.add_get('/timeline/{issue}', self._timeline)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self.runner.cleanup(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+    def url(self, issue:str) -> str:
+        return f'http://127.0.0.1:{self.port}/timeline/{issue}'
+
+    async def _timeline(self, request:web.Request) -> web.Response:
+        self.requests.append(request)
+        if self.failures:
+            status, headers = self.failures.pop(0)
+            if status is None:
+                request.transport.close()
+            return web.Response(status=status or 200, headers=headers)
+        if request.match_info['issue'] not in self.timelines:
+            raise web.HTTPNotFound()
+        events = self.timelines[request.match_info['issue']]
+        page = int(request.query.get('page', 1))
+        body = events[(page - 1) * _PAGE_SIZE:page * _PAGE_SIZE]
+        etag = f'"{request.match_info["issue"]}-{page}-{len(body)}"'
+        if request.headers.get('If-None-Match') == etag:
+            return web.Response(status=304, headers={'ETag': etag})
+        headers = {'ETag': etag}
+        if page * _PAGE_SIZE < len(events):
+            next_url = request.url.update_query({'page': page + 1})
+            headers['Link'] = f'<{next_url}>; rel="next"'
+        return web.json_response(body, headers=headers)
+
+
+class TimelineFetcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = _TimelineServer()
+        self.server.start()
+        self.fetcher = TimelineFetcher(concurrency=2, max_retries=2)
+        self.fetcher.cache_path = None
+        self.fetcher.cache = {}
+
+    def tearDown(self):
+        self.server.stop()
+
+    def _issue(self, name:str, events:int) -> Issue:
+        self.server.timelines[name] = [_timeline_event(i) for i in range(events)]
+        return Issue({'number': 1, 'state': 'open', 'timeline_url': self.server.url(name)})
+
+    def test_pagination(self):
+        issue = self._issue('a', 5)
+        self.assertEqual(self.fetcher.refresh([issue]), 1)
+        self.assertEqual([event.comment for event in issue.events], [f'comment {i}' for i in range(5)])
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertEqual(self.server.requests[0].query['per_page'], '100')
+
+    def test_unchanged_pages_are_revalidated(self):
+        issue = self._issue('a', 3)
+        self.fetcher.refresh([issue])
+        self.server.requests.clear()
+
+        self.assertEqual(self.fetcher.refresh([issue]), 0)
+        self.assertEqual(len(issue.events), 3)
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertTrue(all('If-None-Match' in request.headers for request in self.server.requests))
+
+    def test_new_events_on_last_page(self):
+        issue = self._issue('a', 3)
+        self.fetcher.refresh([issue])
+        # Page 1 is unchanged and answered with 304, page 2 gets a new event
+        self.server.timelines['a'].append(_timeline_event(3))
+
+        self.assertEqual(self.fetcher.refresh([issue]), 1)
+        self.assertEqual([event.comment for event in issue.events], [f'comment {i}' for i in range(4)])
+
+    def test_retry_after_429(self):
+        issue = self._issue('a', 1)
+        self.server.failures.append((429, {'Retry-After': '0'}))
+        self.assertEqual(self.fetcher.refresh([issue]), 1)
+        self.assertEqual(len(issue.events), 1)
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_rate_limited_403_is_retried(self):
+        issue = self._issue('a', 1)
+        self.server.failures.append((403, {'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': '0'}))
+        self.assertEqual(self.fetcher.refresh([issue]), 1)
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_permission_403_fails_immediately(self):
+        issue = self._issue('a', 1)
+        self.server.failures.append((403, {}))
+        self.assertEqual(self.fetcher.refresh([issue]), 0)
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertEqual([(failed, error.status) for failed, error in self.fetcher.failures], [(issue, 403)])
+
+    def test_dropped_connection_is_retried(self):
+        issue = self._issue('a', 1)
+        # aiohttp itself retries a dropped request once, the second drop reaches the fetcher
+        self.server.failures.extend([(None, {}), (None, {})])
+        self.assertEqual(self.fetcher.refresh([issue]), 1)
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertEqual(len(issue.events), 1)
+        self.assertEqual(self.fetcher.failures, [])
+
+    def test_missing_issue_does_not_abort_refresh(self):
+        issues = [self._issue(name, 2) for name in 'abcde']
+        missing = Issue({'number': 6, 'state': 'open', 'timeline_url': self.server.url('deleted')})
+        missing.events = [Event({'event_type': 'closed'})]
+        issues.insert(2, missing)
+        with tempfile.TemporaryDirectory() as directory:
+            self.fetcher.cache_path = os.path.join(directory, 'cache.json')
+            self.assertEqual(self.fetcher.refresh(issues), 5)
+            with open(self.fetcher.cache_path) as fin:
+                self.assertEqual(len(json.load(fin)), 5)
+        self.assertEqual([event.event_type for event in missing.events], ['closed'])
+        self.assertEqual([(failed, error.status) for failed, error in self.fetcher.failures], [(missing, 404)])
+        self.assertTrue(all(len(issue.events) == 2 for issue in issues if issue is not missing))
+
+    def test_events_are_merged_into_issues(self):
+        issue = self._issue('a', 2)
+        issue.events = [Event({'event_type': 'labeled', 'label': 'stale'})]
+        other = Issue({'number': 2, 'state': 'closed'})
+        other.events = [Event({'event_type': 'closed'})]
+        issues = [issue, other]
+
+        self.fetcher.refresh(issues)
+        self.assertIs(issues[0], issue)
+        self.assertEqual([event.event_type for event in issue.events], ['commented', 'commented'])
+        self.assertEqual(issue.events[0].author, 'user0')
+        self.assertEqual(issue.events[0].event_date.day, 1)
+        self.assertEqual([event.event_type for event in other.events], ['closed'])
+
+
+class WriteIssuesTest(unittest.TestCase):
+
+    def test_format_follows_extension(self):
+        issues = [Issue({'number': 1, 'state': 'open'}), Issue({'number': 2, 'state': 'closed'})]
+        with tempfile.TemporaryDirectory() as directory:
+            array_path = os.path.join(directory, 'issues.json')
+            write_issues(array_path, issues)
+            with open(array_path) as fin:
+                self.assertEqual([jobj['number'] for jobj in json.load(fin)], [1, 2])
+
+            ndjson_path = os.path.join(directory, 'issues.ndjson')
+            write_issues(ndjson_path, issues)
+            with open(ndjson_path) as fin:
+                self.assertEqual([json.loads(line)['number'] for line in fin], [1, 2])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,172 @@
+"""
+Supports loading issues without keeping the issue bodies (Issue.text)
+and comments (Event.comment) in memory. While the data file is parsed,
+only the byte offsets of these fields are recorded. The text is read
+from the memory-mapped file when it is accessed, and a bounded LRU
+cache keeps the most recently used bodies in memory.
+
+This only works for uncompressed data files since compressed files
+cannot be read at arbitrary offsets.
+"""
+
+import json
+import mmap
+import re
+from functools import lru_cache
+from typing import Dict, Iterator, List, Tuple
+
+from model import Issue, DeferredText
+
+# A "text" or "comment" key followed by a string value
+_FIELD = re.compile(rb'"(text|comment)"\s*:\s*"')
+
+# The remainder of a JSON string literal up to its closing quote
+_STRING_END = re.compile(rb'[^"\\]*(?:\\.[^"\\]*)*"', re.DOTALL)
+
+
+def find_text_spans(data, start:int=0, end:int=None) -> Tuple[List[Tuple[int,int]],List[Tuple[int,int]]]:
+    """
+    Finds the byte spans of the string values of all "text" and "comment"
+    keys between start and end, in the order in which they appear. The
+    spans include the quotes of the JSON string literal.
+    """
+    end = len(data) if end is None else end
+    spans = {b'text': [], b'comment': []}
+    position = start
+    while True:
+        match = _FIELD.search(data, position, end)
+        if match is None:
+            break
+        position = match.end()
+        # Quotes preceded by an odd number of backslashes are escaped
+        # and thus part of a string rather than the start of a key
+        backslashes = 0
+        while match.start() - backslashes > start and data[match.start() - backslashes - 1] == ord('\\'):
+            backslashes += 1
+        if backslashes % 2 == 1:
+            continue
+        literal_end = _STRING_END.match(data, position, end)
+        if literal_end is None:
+            break
+        spans[match.group(1)].append((position - 1, literal_end.end()))
+        position = literal_end.end()
+    return spans[b'text'], spans[b'comment']
+
+
+class TextStore:
+    """
+    Reads text fields from a memory-mapped data file. The store can be
+    pickled so that issues loaded in worker processes keep working.
+
+    Every store has its own LRU cache. Stores are unpickled into one shared
+    store per data file and cache size, so issues parsed from several byte
+    ranges in parallel still share a single cache of cache_size texts.
+    """
+
+    def __init__(self, path:str, cache_size:int=1024):
+        """
+        Constructor. cache_size is the maximum number of texts kept
+        in memory.
+        """
+        self.path:str = path
+        self.cache_size:int = cache_size
+        self._open()
+
+    def _open(self):
+        self._file = None
+        self._mmap = None
+        self.read = lru_cache(maxsize=self.cache_size)(self._read)
+
+    def _read(self, start:int, end:int) -> str:
+        if self._mmap is None:
+            self._file = open(self.path, 'rb')
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return json.loads(self._mmap[start:end])
+
+    def close(self):
+        """
+        Unmaps the data file. It is mapped again on the next read.
+        """
+        if self._mmap is not None:
+            self._mmap.close()
+            self._file.close()
+        self._open()
+
+    def __reduce__(self):
+        return _shared_store, (self.path, self.cache_size)
+
+
+# Stores created by unpickling, by data file and cache size
+_STORES:Dict[Tuple[str,int],TextStore] = {}
+
+
+def _shared_store(path:str, cache_size:int) -> TextStore:
+    """
+    Returns the store of the process for the given data file,
+    creating it on first use.
+    """
+    key = (path, cache_size)
+    if key not in _STORES:
+        _STORES[key] = TextStore(path, cache_size)
+    return _STORES[key]
+
+
+def _defer_text(issue:Issue, jobj:dict, texts:Iterator, comments:Iterator, store:TextStore):
+    """
+    Replaces the text fields of an issue with references into the store.
+    """
+    if isinstance(jobj.get('text'), str):
+        issue.text = DeferredText(store, *next(texts))
+    for event, jevent in zip(issue.events, jobj.get('events', [])):
+        if isinstance(jevent.get('comment'), str):
+            event.comment = DeferredText(store, *next(comments))
+
+
+def _count_texts(jobjs:List[dict]) -> Tuple[int,int]:
+    texts = sum(isinstance(jobj.get('text'), str) for jobj in jobjs)
+    comments = sum(isinstance(jevent.get('comment'), str) for jobj in jobjs for jevent in jobj.get('events', []))
+    return texts, comments
+
+
+def _to_issues(data, start:int, end:int, jobjs:List[dict], store:TextStore, skip_events:bool) -> List[Issue]:
+    """
+    Creates the issues of the records that were parsed from the given
+    byte range and defers their text fields. If the located fields do
+    not line up with the parsed records, the text is kept in memory.
+    """
+    text_spans, comment_spans = find_text_spans(data, start, end)
+    if skip_events:
+        for jobj in jobjs:
+            jobj['events'] = []
+        comment_spans = []
+    issues = [Issue(jobj) for jobj in jobjs]
+    if _count_texts(jobjs) == (len(text_spans), len(comment_spans)):
+        texts, comments = iter(text_spans), iter(comment_spans)
+        for issue, jobj in zip(issues, jobjs):
+            _defer_text(issue, jobj, texts, comments, store)
+    return issues
+
+
+def load_deferred(path:str, ndjson:bool, start:int=0, end:int=None, cache_size:int=1024, skip_events:bool=False) -> List[Issue]:
+    """
+    Loads the issues of an uncompressed data file (or of a newline-aligned
+    byte range of an NDJSON file) with deferred text fields, optionally
+    leaving out the events.
+    """
+    store = TextStore(path, cache_size)
+    issues:List[Issue] = []
+    with open(path, 'rb') as fin, mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        end = len(data) if end is None else end
+        if not ndjson:
+            # The whole array is parsed at once; only the issues kept afterwards are smaller
+            return _to_issues(data, start, end, json.loads(data[start:end]), store, skip_events)
+        # Parse line by line so that only one record is fully in memory at a time
+        position = start
+        while position < end:
+            line_end = data.find(b'\n', position, end)
+            line_end = end if line_end == -1 else line_end
+            line = data[position:line_end]
+            if line.strip():
+                issues.extend(_to_issues(data, position, line_end, [json.loads(line)], store, skip_events))
+            position = line_end + 1
+    return issues
@@ -0,0 +1,261 @@
+"""
+Refreshes the events of selected issues from the GitHub API through
+their timeline_url, so that the data file does not have to be
+regenerated to pick up new activity.
+
+The timelines are fetched concurrently over a pooled HTTP connection
+with a bounded number of requests in flight. Responses are cached by
+their ETag and Last-Modified headers so that unchanged timelines are
+answered with 304 Not Modified and do not count against the rate limit.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import aiohttp
+
+import config
+from data_loader import DataLoader, open_data_file, is_ndjson
+from model import Issue, Event
+
+
+def _event_from_timeline(jobj:dict) -> dict:
+    """
+    Converts a GitHub timeline event into the event format
+    of the data file.
+    """
+    actor = jobj.get('actor') or jobj.get('user') or {}
+    label = jobj.get('label') or {}
+    return {
+        'event_type': jobj.get('event'),
+        'author': actor.get('login'),
+        'event_date': jobj.get('created_at') or jobj.get('submitted_at') or jobj.get('committer', {}).get('date'),
+        'label': label.get('name'),
+        'comment': jobj.get('body'),
+    }
+
+
+def _next_link(link_header:Optional[str]) -> Optional[str]:
+    """
+    Extracts the URL of the next page from a GitHub Link header.
+    """
+    if not link_header:
+        return None
+    for part in link_header.split(','):
+        url, _, rel = part.partition(';')
+        if 'rel="next"' in rel:
+            return url.strip().strip('<>')
+    return None
+
+
+def _with_page_size(url:str, per_page:int=100) -> str:
+    """
+    Adds the per_page query parameter to a URL unless it is already set.
+    """
+    parts = urlsplit(url)
+    query = parse_qsl(parts.query)
+    if any(name == 'per_page' for name, _ in query):
+        return url
+    return urlunsplit(parts._replace(query=urlencode(query + [('per_page', per_page)])))
+
+
+def write_issues(path:str, issues:List[Issue]):
+    """
+    Writes the issues to a data file in the format given by its extension.
+    """
+    with open_data_file(path, 'wt') as fout:
+        if is_ndjson(path):
+            for issue in issues:
+                fout.write(json.dumps(issue.to_json()))
+                fout.write('\n')
+        else:
+            json.dump([issue.to_json() for issue in issues], fout)
+
+
+class TimelineFetcher:
+    """
+    Fetches issue timelines concurrently and merges them into
+    the loaded issues.
+    """
+
+    def __init__(self, token:str=None, concurrency:int=None, max_retries:int=5, cache_path:str=None):
+        """
+        Constructor. The token, concurrency and cache file default to the
+        ENPM611_PROJECT_GITHUB_TOKEN, ENPM611_PROJECT_FETCH_CONCURRENCY and
+        ENPM611_PROJECT_TIMELINE_CACHE config parameters.
+        """
+        self.token:str = token or config.get_parameter('ENPM611_PROJECT_GITHUB_TOKEN')
+        self.concurrency:int = int(concurrency or config.get_parameter('ENPM611_PROJECT_FETCH_CONCURRENCY', 10))
+        self.max_retries:int = max_retries
+        self.cache_path:str = cache_path or config.get_parameter('ENPM611_PROJECT_TIMELINE_CACHE')
+        # timeline_url -> list of pages, each {'url', 'etag', 'last_modified', 'next', 'events'}
+        self.cache:Dict[str,List[dict]] = {}
+        # Issues whose timeline could not be fetched in the last refresh, with the error
+        self.failures:List[Tuple[Issue,Exception]] = []
+        if self.cache_path and os.path.isfile(self.cache_path):
+            with open(self.cache_path, 'r') as fin:
+                self.cache = json.load(fin)
+
+    def refresh(self, issues:List[Issue]) -> int:
+        """
+        Replaces the events of the given issues with their current
+        timelines and returns the number of issues whose events changed.
+        Issues whose timeline cannot be fetched (e.g. deleted issues) keep
+        their events and are listed in failures.
+        """
+        self.failures = []
+        try:
+            return asyncio.run(self._refresh_all(issues))
+        finally:
+            if self.cache_path:
+                with open(self.cache_path, 'w') as fout:
+                    json.dump(self.cache, fout)
+
+    async def _refresh_all(self, issues:List[Issue]) -> int:
+        headers = {
+            'Accept': 'application/vnd.github+json',
+            'User-Agent': 'ENPM611-timeline-fetcher',
+        }
+        if self.token:
+            headers['Authorization'] = f'Bearer {self.token}'
+        semaphore = asyncio.Semaphore(self.concurrency)
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        # Shared by the workers so that one rate limited response pauses all requests
+        self._resume_at:float = 0
+        async with aiohttp.ClientSession(headers=headers, connector=connector) as session:
+            tasks = [self._refresh_issue(session, semaphore, issue) for issue in issues if issue.timeline_url]
+            results = await asyncio.gather(*tasks)
+        return sum(results)
+
+    async def _refresh_issue(self, session:aiohttp.ClientSession, semaphore:asyncio.Semaphore, issue:Issue) -> bool:
+        try:
+            async with semaphore:
+                jevents, modified = await self._fetch_timeline(session, issue.timeline_url)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as error:
+            self.failures.append((issue, error))
+            return False
+        issue.events = [Event(jevent) for jevent in jevents]
+        return modified
+
+    async def _fetch_timeline(self, session:aiohttp.ClientSession, url:str) -> Tuple[List[dict],bool]:
+        """
+        Fetches all pages of a timeline. Returns the events and whether
+        they changed since they were cached.
+
+        Every page is revalidated with its own ETag/Last-Modified, since new
+        events are appended to the last page while earlier pages stay the same.
+        """
+        cached = {page['url']: page for page in self.cache.get(url, [])}
+        pages:List[dict] = []
+        modified = False
+        page_url = _with_page_size(url)
+        while page_url:
+            cached_page = cached.get(page_url)
+            headers = {}
+            if cached_page and cached_page.get('etag'):
+                headers['If-None-Match'] = cached_page['etag']
+            if cached_page and cached_page.get('last_modified'):
+                headers['If-Modified-Since'] = cached_page['last_modified']
+            status, response_headers, body = await self._get(session, page_url, headers)
+            if status == 304 and cached_page:
+                page = cached_page
+            else:
+                modified = True
+                page = {
+                    'url': page_url,
+                    'etag': response_headers.get('ETag'),
+                    'last_modified': response_headers.get('Last-Modified'),
+                    'next': _next_link(response_headers.get('Link')),
+                    'events': [_event_from_timeline(jobj) for jobj in body or []],
+                }
+            pages.append(page)
+            page_url = page['next']
+
+        # Pages that no longer exist also change the timeline
+        modified = modified or len(pages) != len(cached)
+        self.cache[url] = pages
+        return [jevent for page in pages for jevent in page['events']], modified
+
+    async def _get(self, session:aiohttp.ClientSession, url:str, headers:dict):
+        """
+        Performs a GET request, backing off when the rate limit is
+        exhausted, the server fails temporarily or the connection fails.
+        """
+        for attempt in range(self.max_retries + 1):
+            delay = self._resume_at - time.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            try:
+                async with session.get(url, headers=headers) as response:
+                    if response.status in (200, 304):
+                        body = await response.json() if response.status == 200 else None
+                        return response.status, response.headers, body
+                    retry = response.status == 429 or response.status >= 500 or self._rate_limited(response)
+                    if not retry or attempt == self.max_retries:
+                        response.raise_for_status()
+                    backoff = self._backoff(response, attempt)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if attempt == self.max_retries:
+                    raise
+                backoff = self._backoff(None, attempt)
+            self._resume_at = max(self._resume_at, time.time() + backoff)
+        raise RuntimeError(f'Giving up on {url}')
+
+    def _rate_limited(self, response:aiohttp.ClientResponse) -> bool:
+        """
+        Whether a 403 response is due to the rate limit rather than
+        missing permissions, which retrying cannot fix.
+        """
+        return response.status == 403 and (
+            'Retry-After' in response.headers or response.headers.get('X-RateLimit-Remaining') == '0')
+
+    def _backoff(self, response:Optional[aiohttp.ClientResponse], attempt:int) -> float:
+        """
+        Determines how many seconds to wait before retrying, preferring
+        the server's Retry-After and rate limit reset headers. response
+        is None if the request failed without a response.
+        """
+        if response is None:
+            return float(2 ** attempt)
+        if 'Retry-After' in response.headers:
+            return float(response.headers['Retry-After'])
+        if response.headers.get('X-RateLimit-Remaining') == '0' and 'X-RateLimit-Reset' in response.headers:
+            return max(0.0, float(response.headers['X-RateLimit-Reset']) - time.time())
+        return float(2 ** attempt)
+
+
+def parse_args():
+    """
+    Parses the command line arguments that were provided along
+    with the python command.
+    """
+    ap = argparse.ArgumentParser("timeline_fetcher.py")
+
+    ap.add_argument('--issue', '-i', type=int, nargs='*',
+                    help='Numbers of the issues to refresh')
+    ap.add_argument('--label', '-l', type=str, required=False,
+                    help='Refresh only the issues with this label')
+    ap.add_argument('--output', '-o', type=str, required=True,
+                    help='Path of the data file to write the refreshed issues to')
+
+    return ap.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    issues = DataLoader().get_issues()
+    selected = [issue for issue in issues
+                if (not args.issue or issue.number in args.issue)
+                and (args.label is None or args.label in issue.labels)]
+    fetcher = TimelineFetcher()
+    updated = fetcher.refresh(selected)
+    print(f'Refreshed the events of {updated} of {len(selected)} issues.')
+    for issue, error in fetcher.failures:
+        print(f'Could not refresh issue {issue.number}, keeping its events: {error}')
+    write_issues(args.output, issues)
+    print(f'Saved {len(issues)} issues to {args.output}.')